@@ -0,0 +1,116 @@
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class IdMapping:
+    """
+    Persistent original -> anonymized user id mapping, stored in SQLite.
+
+    Ids are handed out in ascending order and never change once assigned, so
+    exports of overlapping crawls that share a mapping file stay compatible.
+    Nothing is cached in memory, lookups are done in batches against the
+    database. The mapping file contains the original ids, keep it private!
+
+    Additionally tracks which user records have already been exported and up to which
+    size each output file was committed, which allows incremental exports of only new records.
+    Changes are only persisted by commit(), close() discards the rest.
+    """
+
+    # stay below SQLITE_MAX_VARIABLE_NUMBER of older sqlite builds (999)
+    BATCH_SIZE = 900
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS mapping ("
+            "original TEXT PRIMARY KEY, anon INTEGER NOT NULL UNIQUE"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS exported (original TEXT PRIMARY KEY) WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS output_files (path TEXT PRIMARY KEY, size INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self.conn.commit()
+        row = self.conn.execute("SELECT MAX(anon) FROM mapping").fetchone()
+        self.next_id = 0 if row[0] is None else row[0] + 1
+
+    def __len__(self) -> int:
+        return self.next_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _select(self, table: str, column: str, ids: List[str]) -> list:
+        rows = []
+        for start in range(0, len(ids), self.BATCH_SIZE):
+            batch = ids[start:start + self.BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(self.conn.execute(
+                f"SELECT {column} FROM {table} WHERE original IN ({placeholders})", batch
+            ))
+        return rows
+
+    def get_ids(self, original_ids: Iterable) -> Dict[str, int]:
+        """
+        Returns the anonymized id for every given original id, assigning new
+        ascending ids (in order of first appearance) to unknown ones.
+
+        Args:
+            original_ids: Original user ids, duplicates are fine
+
+        Returns:
+            dict: {str(original_id): anonymized_id}
+        """
+        ordered = list(dict.fromkeys(str(i) for i in original_ids))
+        found = dict(self._select("mapping", "original, anon", ordered))
+
+        new_rows = []
+        for original in ordered:
+            if original not in found:
+                found[original] = self.next_id
+                new_rows.append((original, self.next_id))
+                self.next_id += 1
+        if new_rows:
+            self.conn.executemany("INSERT INTO mapping (original, anon) VALUES (?, ?)", new_rows)
+        return found
+
+    def exported(self, original_ids: Iterable) -> Set[str]:
+        """Returns the subset of the given user ids whose records were already exported"""
+        ordered = list(dict.fromkeys(str(i) for i in original_ids))
+        return {row[0] for row in self._select("exported", "original", ordered)}
+
+    def mark_exported(self, original_ids: Iterable):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO exported (original) VALUES (?)",
+            ((str(i),) for i in original_ids),
+        )
+
+    def committed_size(self, output_path: str) -> Optional[int]:
+        """Size of output_path at the last commit, None if it was never exported to"""
+        row = self.conn.execute(
+            "SELECT size FROM output_files WHERE path = ?", (os.path.abspath(output_path),)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set_committed_size(self, output_path: str, size: int):
+        """Stored with the next commit, together with the records marked as exported"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO output_files (path, size) VALUES (?, ?)", (os.path.abspath(output_path), size)
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        """Discards everything since the last commit(), exported marks, new ids and sizes are only kept together"""
+        self.conn.rollback()
+        self.conn.close()
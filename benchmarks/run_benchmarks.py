@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the hot paths in utils.py and the spider.
+
+Every benchmark runs in its own process on synthetic data (see synthetic.py),
+reporting wall time over several repeats, the peak of python allocations
+(tracemalloc) and the peak RSS of the process. Results can be saved as a JSON
+baseline and later runs compared against it, regressions make the script exit
+with status 1, as does a missing baseline.
+
+The baseline lives in benchmarks/baseline.json (--baseline to change). Timings are
+machine specific, so create it with --save-baseline on the machine that runs the
+comparison, from a known good commit.
+
+    uv run python benchmarks/run_benchmarks.py --save-baseline
+    uv run python benchmarks/run_benchmarks.py --scale small medium
+"""
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from queue import Empty
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from synthetic import followers_payload, write_powerlaw_dataset
+
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+SCALES = {
+    "small": {"nodes": 1_000, "profiles": 50, "visited": 10_000},
+    "medium": {"nodes": 20_000, "profiles": 500, "visited": 200_000},
+    "large": {"nodes": 200_000, "profiles": 5_000, "visited": 2_000_000},
+}
+
+# metric -> minimal absolute increase that counts as a regression, so noise on tiny values is ignored
+COMPARED_METRICS = {
+    "time_median": 0.005,
+    "peak_tracemalloc_mb": 1.0,
+}
+
+
+def _quiet(func):
+    """The loaders print statistics, keep the benchmark output readable"""
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return wrapper
+
+
+def _spider(workdir: str):
+    from scraper_scrapy import SpotifyGraphSpider
+
+    spider = SpotifyGraphSpider(
+        start_user="benchmark",
+        depth="2",
+        max_followers="1000000",
+        checkpoint_file=os.path.join(workdir, "checkpoint_benchmark.json"),
+    )
+    return spider
+
+
+def bench_load_graph_v3(ctx):
+    from utils import load_graph_v3
+    return _quiet(lambda: load_graph_v3(ctx["dataset"]))
+
+
+def bench_anonymize_dataset_to_file(ctx):
+    from utils import anonymize_dataset_to_file
+    output_path = os.path.join(ctx["workdir"], "anonymized.jsonl")
+    return _quiet(lambda: anonymize_dataset_to_file(ctx["dataset"], output_path))
+
+
+def _undirected_nk(ctx):
+    from utils import load_graph_csr
+    with contextlib.redirect_stdout(io.StringIO()):
+        return load_graph_csr(ctx["dataset"], remove_selfloops=True).to_nk(directed=False)
+
+
+def bench_approx_average_shortest_path_length_nk(ctx):
+    from utils import approx_average_shortest_path_length_nk
+    graph = _undirected_nk(ctx)
+    num_samples = min(50, graph.numberOfNodes())
+    return lambda: approx_average_shortest_path_length_nk(graph, num_samples, seed=42)
+
+
+def bench_calculate_avg_clustering_coefficient_nk(ctx):
+    from utils import calculate_avg_clustering_coefficient_nk
+    graph = _undirected_nk(ctx)
+    return lambda: calculate_avg_clustering_coefficient_nk(graph)
+
+
+def bench_parse_followers(ctx):
+    """Returns (run, reset), reset restores the spider state untimed after every run"""
+    from scrapy.http import Request, TextResponse
+    from scraper_scrapy import SpotifyToken
+
+    spider = _filled_spider(ctx)
+    for i in range(len(spider.user_queue), ctx["visited"] - 1):
+        spider.user_queue.append((f"queued{i}", 2, f"Queued {i}", i))
+    for i in range(spider.min_tokens):
+        spider.tokens.append(SpotifyToken({"authorization": f"Bearer token{i}", "client-token": f"client{i}"}))
+    # the scraped user sits at the end of a crawl sized queue, like in a long running crawl
+    queue_entry = ("benchmark", 0, None, None)
+    spider.user_queue.append(queue_entry)
+    queue_length = len(spider.user_queue)
+
+    url = "https://spclient.wg.spotify.com/user-profile-view/v3/profile/benchmark/followers?market=from_token"
+    request = Request(url, meta={"user_id": "benchmark", "depth": 0, "known_name": None, "known_followers_count": None})
+    response = TextResponse(url, status=200, body=followers_payload(ctx["profiles"], seed=42), encoding="utf-8", request=request)
+    follower_ids = {f"follower{i}" for i in range(ctx["profiles"])}
+
+    def run():
+        return asyncio.run(spider.parse_followers(response))
+
+    def reset():
+        # every run has to discover the followers again
+        while len(spider.user_queue) >= queue_length:
+            spider.user_queue.pop()
+        spider.user_queue.append(queue_entry)
+        spider.visited_users -= follower_ids
+        spider.pending_requests.clear()
+
+    return run, reset
+
+
+def _filled_spider(ctx):
+    spider = _spider(ctx["workdir"])
+    spider.visited_users = {f"user{i}" for i in range(ctx["visited"])}
+    for i in range(ctx["visited"] // 2):
+        spider.user_queue.append((f"queued{i}", 2, f"Queued {i}", i))
+    return spider
+
+
+def bench_save_checkpoint(ctx):
+    spider = _filled_spider(ctx)
+    return spider.save_checkpoint
+
+
+def bench_restore_from_checkpoint(ctx):
+    spider = _filled_spider(ctx)
+    spider.save_checkpoint()
+
+    def run():
+        spider.user_queue.clear()
+        spider.restore_from_checkpoint(spider.load_checkpoint(spider.checkpoint_file))
+    return run
+
+
+BENCHMARKS = {
+    "load_graph_v3": bench_load_graph_v3,
+    "anonymize_dataset_to_file": bench_anonymize_dataset_to_file,
+    "approx_average_shortest_path_length_nk": bench_approx_average_shortest_path_length_nk,
+    "calculate_avg_clustering_coefficient_nk": bench_calculate_avg_clustering_coefficient_nk,
+    "parse_followers": bench_parse_followers,
+    "save_checkpoint": bench_save_checkpoint,
+    "restore_from_checkpoint": bench_restore_from_checkpoint,
+}
+
+
+def _measure(name: str, ctx: dict, repeats: int, queue):
+    """Runs in a fresh process, so peak RSS and imports are not shared between benchmarks"""
+    logging.disable(logging.WARNING)  # the spider logs every scraped user
+    try:
+        func = BENCHMARKS[name](ctx)
+        reset = lambda: None
+        if isinstance(func, tuple):
+            func, reset = func
+        func()  # warmup
+        reset()
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+            reset()
+
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        queue.put({
+            "time_median": statistics.median(times),
+            "time_min": min(times),
+            "repeats": repeats,
+            "peak_tracemalloc_mb": peak / 1024 ** 2,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        })
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_benchmarks(scales, names, repeats: int = 5) -> dict:
+    results = {}
+    mp = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in scales:
+            dataset = os.path.join(workdir, f"graph_{scale}.jsonl")
+            num_edges = write_powerlaw_dataset(dataset, SCALES[scale]["nodes"], seed=42)
+            print(f"[{scale}] synthetic graph: {SCALES[scale]['nodes']} nodes, {num_edges} edges")
+            ctx = {"dataset": dataset, "workdir": workdir, **SCALES[scale]}
+
+            for name in names:
+                queue = mp.Queue()
+                process = mp.Process(target=_measure, args=(name, ctx, repeats, queue))
+                process.start()
+                process.join()
+                try:
+                    result = queue.get(timeout=5)
+                except Empty:
+                    result = {"error": f"process died with exit code {process.exitcode}"}
+
+                key = f"{name}[{scale}]"
+                results[key] = result
+                if "error" in result:
+                    print(f"  {key}: FAILED {result['error']}")
+                else:
+                    print(
+                        f"  {key}: {result['time_median'] * 1000:.1f} ms (min {result['time_min'] * 1000:.1f} ms), "
+                        f"peak alloc {result['peak_tracemalloc_mb']:.1f} MB, max rss {result['max_rss_mb']:.1f} MB"
+                    )
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Returns (benchmark, metric, baseline value, current value) for every regression"""
+    regressions = []
+    for key, result in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None or "error" in base or "error" in result:
+            continue
+        for metric, min_increase in COMPARED_METRICS.items():
+            if result[metric] > base[metric] * threshold and result[metric] - base[metric] > min_increase:
+                regressions.append((key, metric, base[metric], result[metric]))
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the micro-benchmarks and compare them to a baseline')
+    parser.add_argument('--scale', nargs='+', choices=list(SCALES), default=["small", "medium"], help='Scales to run (default: small medium)')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS), help='Benchmarks to run (default: all)')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed runs per benchmark (default: 5)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file (default: benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as new baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Flag results slower/larger than threshold * baseline (default: 1.25)')
+    parser.add_argument('--output', help='Also write the results of this run to a JSON file')
+
+    args = parser.parse_args()
+
+    current = run_benchmarks(args.scale, args.only, args.repeats)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline found at {args.baseline}, nothing to compare against. Run with --save-baseline first")
+        sys.exit(1)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold)
+    if not regressions:
+        print(f"No regressions against {args.baseline} (threshold {args.threshold}x)")
+        return
+
+    print(f"Regressions against {args.baseline} (threshold {args.threshold}x):")
+    for key, metric, base, value in regressions:
+        print(f"  {key} {metric}: {base:.4f} -> {value:.4f} ({value / base:.2f}x)")
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Synthetic data for the benchmarks, so they run offline and without a real crawl.
+"""
+import json
+
+import numpy as np
+
+
+def powerlaw_degrees(num_nodes: int, exponent: float = 2.1, seed: int | None = None) -> np.ndarray:
+    """Follower counts drawn from a discrete power law (zipf), capped at num_nodes - 1"""
+    rng = np.random.default_rng(seed)
+    return np.minimum(rng.zipf(exponent, num_nodes), num_nodes - 1)
+
+
+def write_powerlaw_dataset(path: str, num_nodes: int, exponent: float = 2.1, seed: int | None = None) -> int:
+    """
+    Writes a crawl in the scraper output format (see README) where the number of followers
+    per user follows a power law, like the real follower network.
+
+    Returns:
+        int: Number of edges written
+    """
+    rng = np.random.default_rng(seed)
+    degrees = powerlaw_degrees(num_nodes, exponent, seed)
+    num_edges = 0
+    with open(path, "w") as f:
+        for user in range(num_nodes):
+            followers = np.unique(rng.integers(0, num_nodes, degrees[user]))
+            record = {
+                "id": f"user{user}",
+                "name": f"name{user}",
+                "depth": 0,
+                "followers_count": int(degrees[user]),
+                "follower_profiles": [[f"user{v}", f"name{v}", int(degrees[v])] for v in followers],
+            }
+            f.write(json.dumps(record) + "\n")
+            num_edges += len(followers)
+    return num_edges
+
+
+def followers_payload(num_profiles: int, seed: int | None = None) -> bytes:
+    """Body of a /followers API response with num_profiles profiles"""
+    degrees = powerlaw_degrees(max(num_profiles, 2), seed=seed)
+    profiles = [
+        {
+            "uri": f"spotify:user:follower{i}",
+            "name": f"Follower {i}",
+            "followers_count": int(degrees[i]),
+            "image_url": "",
+            "color": 0,
+        }
+        for i in range(num_profiles)
+    ]
+    return json.dumps({"profiles": profiles}).encode()
@@ -0,0 +1,305 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+
+class CallbackStats:
+    """Accumulated wall and CPU time of one spider method"""
+    def __init__(self):
+        self.count = 0
+        self.wall_total = 0.0
+        self.wall_max = 0.0
+        self.cpu_total = 0.0
+
+    def add(self, wall: float, cpu: float):
+        self.count += 1
+        self.wall_total += wall
+        self.wall_max = max(self.wall_max, wall)
+        self.cpu_total += cpu
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "wall_total": self.wall_total,
+            "wall_avg": self.wall_total / self.count if self.count else 0.0,
+            "wall_max": self.wall_max,
+            "cpu_total": self.cpu_total,
+        }
+
+
+class _TimedCoroutine:
+    """Awaitable that only times the synchronous steps of a coroutine, not the time it is suspended"""
+    def __init__(self, coroutine, stats: CallbackStats):
+        self.coroutine = coroutine
+        self.stats = stats
+
+    def __await__(self):
+        wall = cpu = 0.0
+        value, error = None, None
+        try:
+            while True:
+                wall_start, cpu_start = time.perf_counter(), time.thread_time()
+                try:
+                    if error is not None:
+                        yielded = self.coroutine.throw(error)
+                    else:
+                        yielded = self.coroutine.send(value)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    wall += time.perf_counter() - wall_start
+                    cpu += time.thread_time() - cpu_start
+                try:
+                    value, error = (yield yielded), None
+                except GeneratorExit:
+                    self.coroutine.close()
+                    raise
+                except BaseException as e:
+                    value, error = None, e
+        finally:
+            self.stats.add(wall, cpu)
+
+
+def current_rss_mb():
+    """Current resident set size from /proc/self/statm, Linux only, None elsewhere"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+
+class CrawlProfiler:
+    """
+    Opt-in scrapy extension that shows whether a slow crawl is caused by the network or by our own code.
+
+    Enable with run_scraper.py --profile, which registers the extension and sets PROFILING_ENABLED=True.
+    Writes JSONL records to PROFILING_OUTPUT:
+    - "sample" every PROFILING_INTERVAL seconds: event loop lag, current RSS (Linux only, null elsewhere)
+      and size of the spider's in-memory structures
+    - "callbacks" every PROFILING_SUMMARY_EVERY samples and at close: wall/CPU time per spider callback/errback
+    - "snapshot" when the loop is blocked longer than PROFILING_LAG_THRESHOLD seconds: a watchdog thread samples
+      the stack of the reactor thread while it is blocked and writes them as folded stacks (flamegraph.pl, speedscope)
+
+    For async callbacks only the steps between awaits are timed, the time spent waiting (e.g. for a token) is not.
+    """
+
+    PROFILED_METHODS = (
+        "parse_followers",
+        "errback_followers",
+        "parse_token_page",
+        "errback_token",
+        "create_token_request",
+        "process_pending_requests",
+        "save_checkpoint",
+    )
+    TRACKED_STRUCTURES = ("visited_users", "user_queue", "pending_requests", "tokens")
+
+    def __init__(self, output_path=None, interval=1.0, lag_threshold=0.5, snapshot_duration=5.0,
+                 snapshot_cooldown=60.0, summary_every=10):
+        self.output_path = output_path
+        self.interval = interval
+        self.lag_threshold = lag_threshold
+        self.snapshot_duration = snapshot_duration
+        self.snapshot_cooldown = snapshot_cooldown
+        self.summary_every = summary_every
+
+        self.spider = None
+        self.file = None
+        self.write_lock = threading.Lock()
+        self.callback_stats = {}
+        self.samples = 0
+        self.max_lag = 0.0
+        self.snapshots = 0
+        self._heartbeat = None
+        self._last_beat = time.perf_counter()
+        self._stopped = threading.Event()
+        self._watchdog = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("PROFILING_ENABLED"):
+            raise NotConfigured
+        extension = cls(
+            output_path=settings.get("PROFILING_OUTPUT"),
+            interval=settings.getfloat("PROFILING_INTERVAL", 1.0),
+            lag_threshold=settings.getfloat("PROFILING_LAG_THRESHOLD", 0.5),
+            snapshot_duration=settings.getfloat("PROFILING_SNAPSHOT_DURATION", 5.0),
+            snapshot_cooldown=settings.getfloat("PROFILING_SNAPSHOT_COOLDOWN", 60.0),
+            summary_every=settings.getint("PROFILING_SUMMARY_EVERY", 10),
+        )
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.spider = spider
+        if self.output_path is None:
+            self.output_path = f"profile_{spider.name}_{int(time.time())}.jsonl"
+        self.file = open(self.output_path, "a")
+
+        # requests store bound methods, so this has to happen before the first request is created
+        for name in self.PROFILED_METHODS:
+            method = getattr(spider, name, None)
+            if method is not None:
+                setattr(spider, name, self._wrap(name, method))
+
+        self._last_beat = time.perf_counter()
+        self._schedule_beat()
+        self._watchdog = threading.Thread(
+            target=self._watch, args=(threading.get_ident(),), name="crawl-profiler-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        spider.logger.info(f"Profiling enabled, writing to {self.output_path}")
+
+    def spider_closed(self, spider, reason):
+        self._stopped.set()
+        if self._heartbeat is not None and self._heartbeat.active():
+            self._heartbeat.cancel()
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.snapshot_duration + 1)
+        self._write_callbacks()
+        self.file.close()
+
+        spider.logger.info(f"Profiling: max loop lag {self.max_lag:.3f}s, {self.snapshots} stack snapshot(s), see {self.output_path}")
+        for name, stats in sorted(self.callback_stats.items(), key=lambda item: -item[1].wall_total):
+            spider.logger.info(
+                f"  {name}: {stats.count} calls, wall {stats.wall_total:.2f}s (max {stats.wall_max:.3f}s), cpu {stats.cpu_total:.2f}s"
+            )
+
+    def _write(self, record: dict):
+        with self.write_lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+
+    def _wrap(self, name, method):
+        stats = self.callback_stats.setdefault(name, CallbackStats())
+
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def wrapper(*args, **kwargs):
+                return await _TimedCoroutine(method(*args, **kwargs), stats)
+
+        elif inspect.isgeneratorfunction(method):
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                # only count the time spent inside the generator, not in its consumer
+                wall = cpu = 0.0
+                generator = method(*args, **kwargs)
+                try:
+                    while True:
+                        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                        finally:
+                            wall += time.perf_counter() - wall_start
+                            cpu += time.thread_time() - cpu_start
+                        yield item
+                finally:
+                    stats.add(wall, cpu)
+
+        else:
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                wall_start, cpu_start = time.perf_counter(), time.thread_time()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    stats.add(time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+
+        return wrapper
+
+    def _schedule_beat(self):
+        from twisted.internet import reactor
+        self._heartbeat = reactor.callLater(self.interval, self._beat)
+
+    def _beat(self):
+        """Runs on the reactor, lag is how much later than scheduled it got called"""
+        now = time.perf_counter()
+        lag = max(0.0, now - self._last_beat - self.interval)
+        self._last_beat = now
+        self.max_lag = max(self.max_lag, lag)
+        self.samples += 1
+
+        structures = {}
+        for name in self.TRACKED_STRUCTURES:
+            value = getattr(self.spider, name, None)
+            if value is not None:
+                # shallow size of the container, walking millions of entries would cause the lag we measure
+                structures[name] = {"len": len(value), "bytes": sys.getsizeof(value)}
+
+        self._write({
+            "type": "sample",
+            "time": time.time(),
+            "loop_lag": lag,
+            "rss_mb": current_rss_mb(),
+            "structures": structures,
+        })
+        if self.samples % self.summary_every == 0:
+            self._write_callbacks()
+
+        if not self._stopped.is_set():
+            self._schedule_beat()
+
+    def _write_callbacks(self):
+        self._write({
+            "type": "callbacks",
+            "time": time.time(),
+            "callbacks": {name: stats.to_dict() for name, stats in self.callback_stats.items()},
+        })
+
+    def _blocked_for(self) -> float:
+        return time.perf_counter() - self._last_beat - self.interval
+
+    def _watch(self, reactor_thread_id: int):
+        """Watchdog thread, samples the reactor thread's stack while the loop is blocked"""
+        next_snapshot = 0.0
+        while not self._stopped.wait(0.05):
+            if self._blocked_for() < self.lag_threshold or time.monotonic() < next_snapshot:
+                continue
+
+            lag = self._blocked_for()
+            stacks = Counter()
+            end = time.monotonic() + self.snapshot_duration
+            while time.monotonic() < end and self._blocked_for() > 0 and not self._stopped.is_set():
+                frame = sys._current_frames().get(reactor_thread_id)
+                if frame is not None:
+                    stacks[self._fold(frame)] += 1
+                time.sleep(0.005)
+            if not stacks:
+                continue
+
+            self.snapshots += 1
+            path = f"{self.output_path.removesuffix('.jsonl')}_stacks_{self.snapshots}.folded"
+            with open(path, "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            self._write({
+                "type": "snapshot",
+                "time": time.time(),
+                "loop_lag": lag,
+                "samples": sum(stacks.values()),
+                "path": path,
+            })
+            next_snapshot = time.monotonic() + self.snapshot_cooldown
+
+    @staticmethod
+    def _fold(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
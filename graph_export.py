@@ -0,0 +1,338 @@
+import gzip
+import json
+import os
+
+import networkit as nk
+import networkx as nx
+import numpy as np
+from scipy.sparse.csgraph import connected_components, shortest_path
+
+from utils import CSRGraph
+
+
+def _pivot_mds(undirected, num_pivots: int, rng) -> np.ndarray:
+    """PivotMDS (Brandes & Pich, 2007) of one connected component"""
+    num_nodes = undirected.shape[0]
+    num_pivots = min(num_pivots, num_nodes)
+
+    # max/min pivot strategy, every pivot is the node farthest away from the previous ones
+    distances = np.empty((num_nodes, num_pivots), dtype=np.float32)
+    closest = np.full(num_nodes, np.inf)
+    pivot = int(rng.integers(num_nodes))
+    for k in range(num_pivots):
+        dists = shortest_path(undirected, directed=False, unweighted=True, indices=pivot)
+        distances[:, k] = dists
+        closest = np.minimum(closest, dists)
+        pivot = int(np.argmax(closest))
+
+    # double centering of the squared distances
+    squared = distances.astype(np.float64) ** 2
+    squared -= squared.mean(axis=0)
+    squared -= squared.mean(axis=1, keepdims=True)
+    squared *= -0.5
+
+    _, eigenvectors = np.linalg.eigh(squared.T @ squared)
+    return squared @ eigenvectors[:, -2:][:, ::-1]
+
+
+def pivot_mds_layout(
+    graph: CSRGraph,
+    num_pivots: int = 16,
+    seed: int | None = None,
+    min_component_size: int = 50
+) -> np.ndarray:
+    """
+    Computes a 2D layout of the whole graph with PivotMDS (Brandes & Pich, 2007).
+
+    Every connected component of the undirected graph is laid out on its own, so each one
+    gets its own pivots. Components are then packed in rows, largest first, each in a box
+    with side sqrt(size). Only num_pivots BFS runs per component are needed, so this scales
+    to the full network. Components smaller than min_component_size are drawn as circles.
+
+    Args:
+        graph: A CSRGraph
+        num_pivots (int): Number of pivot nodes, more pivots give a more precise layout
+        min_component_size (int): Smallest component laid out with PivotMDS
+
+    Returns:
+        np.ndarray: float32 array of shape (num_nodes, 2)
+    """
+    rng = np.random.default_rng(seed)
+    adjacency = graph.to_scipy()
+    undirected = (adjacency + adjacency.T).tocsr()
+    num_components, labels = connected_components(undirected, directed=False)
+
+    sizes = np.bincount(labels, minlength=num_components)
+    members = np.argsort(labels, kind="stable")
+    starts = np.zeros(num_components + 1, dtype=np.int64)
+    np.cumsum(sizes, out=starts[1:])
+    sides = np.sqrt(sizes)
+
+    # small components as circles, vectorized as there can be millions of them
+    layout = np.zeros((graph.num_nodes, 2))
+    rank = np.empty(graph.num_nodes, dtype=np.int64)
+    rank[members] = np.arange(graph.num_nodes) - starts[labels[members]]
+    angle = 2 * np.pi * rank / sizes[labels]
+    radius = np.where(sizes[labels] > 1, sides[labels] / 2, 0.0)
+    layout[:, 0] = radius * np.cos(angle)
+    layout[:, 1] = radius * np.sin(angle)
+
+    for component in np.flatnonzero(sizes >= max(min_component_size, 3)):
+        nodes = members[starts[component]:starts[component + 1]]
+        local = _pivot_mds(undirected[nodes][:, nodes], num_pivots, rng)
+        local -= local.mean(axis=0)
+        extent = np.abs(local).max()
+        layout[nodes] = local / extent * sides[component] / 2 if extent > 0 else 0.0
+
+    # shelf packing, every component is centered in its box
+    offsets = np.zeros((num_components, 2))
+    row_width = max(np.sqrt((sides ** 2).sum()), sides.max()) if num_components else 0.0
+    x = y = row_height = 0.0
+    for component in np.argsort(sizes, kind="stable")[::-1]:
+        side = sides[component] + 1  # gap between components
+        if x > 0 and x + side > row_width:
+            x, y = 0.0, y + row_height
+            row_height = 0.0
+        offsets[component] = (x + side / 2, y + side / 2)
+        row_height = max(row_height, side)
+        x += side
+
+    layout += offsets[labels]
+    return layout.astype(np.float32)
+
+
+def _total_degree(graph: CSRGraph) -> np.ndarray:
+    return graph.out_degree() + graph.in_degree()
+
+
+def _label(graph: CSRGraph, i: int) -> str:
+    name = graph.names[i]
+    return name if name else str(graph.node_ids[i])
+
+
+def _node_view(name: str, graph: CSRGraph, layout: np.ndarray, nodes: np.ndarray) -> dict:
+    """Builds a view of the subgraph induced by nodes, edge endpoints are positions in the node list"""
+    submatrix = graph.to_scipy()[nodes][:, nodes].tocoo()
+    degree = _total_degree(graph)
+    return {
+        "name": name,
+        "nodes": {
+            "id": [graph.node_ids[i] for i in nodes],
+            "label": [_label(graph, i) for i in nodes],
+            "x": np.round(layout[nodes, 0], 2).tolist(),
+            "y": np.round(layout[nodes, 1], 2).tolist(),
+            "size": degree[nodes].tolist(),
+            "followers_count": graph.followers_count[nodes].tolist(),
+        },
+        "edges": {
+            "source": submatrix.row.tolist(),
+            "target": submatrix.col.tolist(),
+            "weight": [1] * submatrix.nnz,
+        },
+    }
+
+
+def backbone_view(
+    graph: CSRGraph,
+    layout: np.ndarray,
+    max_nodes: int = 2000,
+    core_numbers: np.ndarray | None = None
+) -> dict:
+    """
+    The max_nodes nodes deepest in the k-core decomposition of the undirected graph,
+    ties broken by total degree. Gives the densely connected center of the network.
+
+    Args:
+        graph: A CSRGraph
+        layout: Output of pivot_mds_layout
+        max_nodes (int): Size of the view
+        core_numbers: Precomputed core numbers, computed with NetworKit if None
+
+    Returns:
+        dict: view, see write_view
+    """
+    if core_numbers is None:
+        core_decomposition = nk.centrality.CoreDecomposition(graph.to_nk(directed=False))
+        core_decomposition.run()
+        core_numbers = np.asarray(core_decomposition.scores())
+    order = np.lexsort((_total_degree(graph), core_numbers))[::-1]
+    nodes = np.sort(order[:max_nodes])
+    return _node_view("backbone", graph, layout, nodes)
+
+
+def community_view(
+    graph: CSRGraph,
+    layout: np.ndarray,
+    max_communities: int = 500,
+    communities: np.ndarray | None = None,
+    seed: int | None = None
+) -> dict:
+    """
+    One supernode per community, placed at the mean position of its members and sized
+    by member count. Edge weights count the follower edges between two communities.
+    Only the max_communities largest communities are kept.
+
+    Args:
+        graph: A CSRGraph
+        layout: Output of pivot_mds_layout
+        max_communities (int): Number of supernodes in the view
+        communities: Community id per node, computed with Louvain (NetworKit PLM) if None
+
+    Returns:
+        dict: view, see write_view
+    """
+    if communities is None:
+        if seed is not None:
+            nk.engineering.setSeed(seed, useThreadId=False)
+        plm = nk.community.PLM(graph.to_nk(directed=False), refine=True)
+        plm.run()
+        communities = np.asarray(plm.getPartition().getVector())
+    communities = np.unique(communities, return_inverse=True)[1]
+
+    sizes = np.bincount(communities)
+    kept = np.argsort(sizes)[::-1][:max_communities]
+    position = np.full(len(sizes), -1, dtype=np.int64)
+    position[kept] = np.arange(len(kept))
+
+    x = np.bincount(communities, weights=layout[:, 0]) / sizes
+    y = np.bincount(communities, weights=layout[:, 1]) / sizes
+
+    coo = graph.to_scipy().tocoo()
+    source = position[communities[coo.row]]
+    target = position[communities[coo.col]]
+    keep = (source >= 0) & (target >= 0) & (source != target)
+    source, target = np.minimum(source[keep], target[keep]), np.maximum(source[keep], target[keep])
+    pairs, weights = np.unique(source * len(kept) + target, return_counts=True)
+
+    return {
+        "name": "communities",
+        "nodes": {
+            "id": kept.tolist(),
+            "label": [f"community {c} ({sizes[c]} users)" for c in kept],
+            "x": np.round(x[kept], 2).tolist(),
+            "y": np.round(y[kept], 2).tolist(),
+            "size": sizes[kept].tolist(),
+            "followers_count": [None] * len(kept),
+        },
+        "edges": {
+            "source": (pairs // len(kept)).tolist(),
+            "target": (pairs % len(kept)).tolist(),
+            "weight": weights.tolist(),
+        },
+    }
+
+
+def ego_view(
+    graph: CSRGraph,
+    layout: np.ndarray,
+    user_id,
+    radius: int = 1,
+    max_nodes: int = 1000
+) -> dict:
+    """
+    Followers and followings of a user up to radius hops. If there are more than
+    max_nodes, the ones with the highest total degree are kept (the ego itself always).
+
+    Args:
+        graph: A CSRGraph
+        layout: Output of pivot_mds_layout
+        user_id: Id of the ego user as in the dataset
+        radius (int): Number of hops, ignoring edge direction
+        max_nodes (int): Size of the view
+
+    Returns:
+        dict: view, see write_view
+    """
+    ego = graph.index_of(user_id)
+    adjacency = graph.to_scipy()
+    undirected = (adjacency + adjacency.T).tocsr()
+
+    reached = np.zeros(graph.num_nodes, dtype=bool)
+    reached[ego] = True
+    frontier = np.array([ego])
+    for _ in range(radius):
+        neighbors = np.unique(undirected[frontier].indices)
+        frontier = neighbors[~reached[neighbors]]
+        reached[frontier] = True
+        # no need to go further, the view gets cut down to max_nodes anyway
+        if reached.sum() >= max_nodes * 10 or len(frontier) == 0:
+            break
+
+    nodes = np.flatnonzero(reached)
+    if len(nodes) > max_nodes:
+        degree = _total_degree(graph)[nodes]
+        degree[nodes == ego] = np.iinfo(degree.dtype).max
+        nodes = np.sort(nodes[np.argsort(degree)[::-1][:max_nodes]])
+    return _node_view(f"ego_{user_id}", graph, layout, nodes)
+
+
+def write_view(view: dict, path: str):
+    """
+    Writes a view as gzipped columnar JSON:
+    {
+        "name": str,
+        "nodes": {"id": [...], "label": [...], "x": [...], "y": [...], "size": [...], "followers_count": [...]},
+        "edges": {"source": [...], "target": [...], "weight": [...]}  # positions in the node lists
+    }
+    """
+    with gzip.open(path, "wt") as f:
+        json.dump(view, f, separators=(",", ":"))
+
+
+def load_view(path: str) -> nx.Graph:
+    """
+    Loads a view written by write_view as a NetworkX graph with x, y, size and label
+    node attributes, ready for ipysigma (Sigma(G)) or pyvis (Network().from_nx(G)).
+    """
+    with gzip.open(path, "rt") as f:
+        view = json.load(f)
+    nodes = view["nodes"]
+    G = nx.Graph(name=view["name"])
+    for i, node_id in enumerate(nodes["id"]):
+        G.add_node(
+            node_id,
+            label=nodes["label"][i],
+            x=nodes["x"][i],
+            y=nodes["y"][i],
+            size=nodes["size"][i],
+            followers_count=nodes["followers_count"][i],
+        )
+    edges = view["edges"]
+    for source, target, weight in zip(edges["source"], edges["target"], edges["weight"]):
+        G.add_edge(nodes["id"][source], nodes["id"][target], weight=weight)
+    return G
+
+
+def export_views(
+    graph: CSRGraph,
+    output_dir: str,
+    ego_users=(),
+    backbone_size: int = 2000,
+    max_communities: int = 500,
+    ego_size: int = 1000,
+    num_pivots: int = 16,
+    seed: int | None = None
+) -> dict:
+    """
+    Computes the layout once and writes the backbone, community and ego views to output_dir.
+    All views share the same coordinates, so they can be compared side by side.
+
+    Returns:
+        dict: {view name: path}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    layout = pivot_mds_layout(graph, num_pivots=num_pivots, seed=seed)
+
+    views = [
+        backbone_view(graph, layout, max_nodes=backbone_size),
+        community_view(graph, layout, max_communities=max_communities, seed=seed),
+    ]
+    views.extend(ego_view(graph, layout, user_id, max_nodes=ego_size) for user_id in ego_users)
+
+    paths = {}
+    for view in views:
+        path = os.path.join(output_dir, f"{view['name']}.json.gz")
+        write_view(view, path)
+        paths[view["name"]] = path
+        print(f"Wrote {view['name']}: {len(view['nodes']['id'])} nodes, {len(view['edges']['source'])} edges")
+    return paths
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Run (approximate) centrality and community jobs on the crawled graph.
+
+Results are stored as node table columns in <results_dir>/<graph fingerprint>/,
+so they are only reused for the exact graph they were computed on. Long jobs
+persist their progress after every batch and continue where they stopped when
+run again.
+"""
+import inspect
+import json
+import os
+import time
+
+import networkit as nk
+import numpy as np
+import pandas as pd
+
+from utils import CSRGraph, load_graph_csr
+
+
+class NodeTable:
+    """Result columns of one graph, stored as one .npy file per column"""
+
+    def __init__(self, results_dir: str, graph: CSRGraph):
+        self.graph = graph
+        self.path = os.path.join(results_dir, graph.fingerprint())
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def _atomic_save(path: str, save):
+        # write to a temp file first, a killed kernel must not leave a broken result behind
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            save(f)
+        os.replace(tmp_path, path)
+
+    def columns(self) -> list:
+        return sorted(f[:-4] for f in os.listdir(self.path) if f.endswith(".npy"))
+
+    def has(self, column: str) -> bool:
+        return os.path.exists(self._file(f"{column}.npy"))
+
+    def load(self, column: str) -> np.ndarray:
+        return np.load(self._file(f"{column}.npy"))
+
+    def load_params(self, column: str) -> dict | None:
+        """Parameters a column was computed with, None if unknown"""
+        path = self._file(f"{column}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f).get("params")
+
+    def save(self, column: str, values: np.ndarray, params: dict | None = None):
+        self._atomic_save(self._file(f"{column}.npy"), lambda f: np.save(f, values))
+        self._atomic_save(
+            self._file(f"{column}.json"),
+            lambda f: f.write(json.dumps({"params": params or {}, "finished": time.time()}).encode()),
+        )
+
+    def load_partial(self, column: str) -> dict | None:
+        path = self._file(f"{column}.partial.npz")
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return {key: data[key] for key in data.files}
+
+    def save_partial(self, column: str, **state):
+        self._atomic_save(self._file(f"{column}.partial.npz"), lambda f: np.savez(f, **state))
+
+    def drop_partial(self, column: str):
+        path = self._file(f"{column}.partial.npz")
+        if os.path.exists(path):
+            os.remove(path)
+
+    def to_dataframe(self, columns=None) -> pd.DataFrame:
+        """All (or the given) result columns indexed by user id"""
+        columns = columns or self.columns()
+        return pd.DataFrame(
+            {column: self.load(column) for column in columns},
+            index=pd.Index(self.graph.node_ids, name="id"),
+        )
+
+
+def _sampled_betweenness(runner, column, samples: int = 1000, batch_size: int = 100, seed: int | None = None):
+    """
+    Betweenness estimated from samples source nodes (Brandes & Pich), run in batches.
+    The weighted mean of the batch estimates is stored after every batch, together with
+    the sampling parameters. Progress made with other parameters is discarded.
+    """
+    graph = runner.nk_graph(directed=False)
+    params = json.dumps({"batch_size": batch_size, "seed": seed}, sort_keys=True)
+    state = runner.table.load_partial(column)
+    if state and str(state.get("params", "")) != params:
+        print(f"{column}: discarding progress made with different parameters ({state.get('params', 'unknown')})")
+        state = None
+    total = state["total"] if state else np.zeros(graph.numberOfNodes())
+    done = int(state["done"]) if state else 0
+    if done:
+        print(f"{column}: resuming after {done}/{samples} samples")
+
+    while done < samples:
+        batch = min(batch_size, samples - done)
+        if seed is not None:
+            nk.engineering.setSeed(seed + done, useThreadId=True)
+        estimate = nk.centrality.EstimateBetweenness(graph, batch, normalized=True, parallel=True)
+        estimate.run()
+        total += np.asarray(estimate.scores()) * batch
+        done += batch
+        runner.table.save_partial(column, total=total, done=done, params=np.array(params))
+        print(f"{column}: {done}/{samples} samples")
+    return total / done
+
+
+def _kadabra_betweenness(runner, column, error: float = 0.01, delta: float = 0.1, k: int = 0, seed: int | None = None):
+    """KADABRA adaptive sampling, if k > 0 only the top-k nodes are guaranteed to be ranked correctly"""
+    if seed is not None:
+        nk.engineering.setSeed(seed, useThreadId=True)
+    kadabra = nk.centrality.KadabraBetweenness(runner.nk_graph(directed=False), err=error, delta=delta, k=k)
+    kadabra.run()
+    return np.asarray(kadabra.scores())
+
+
+def _topk_closeness(runner, column, k: int = 100):
+    """Exact closeness of the top-k nodes (Bergamini et al.), NaN for all others"""
+    topk = nk.centrality.TopCloseness(runner.nk_graph(directed=False), k=k, first_heu=True, sec_heu=True)
+    topk.run()
+    values = np.full(runner.graph.num_nodes, np.nan)
+    values[topk.topkNodesList()] = topk.topkScoresList()
+    return values
+
+
+def _pagerank(runner, column, damping: float = 0.85, tolerance: float = 1e-8):
+    pagerank = nk.centrality.PageRank(runner.nk_graph(directed=True), damp=damping, tol=tolerance)
+    pagerank.run()
+    return np.asarray(pagerank.scores())
+
+
+def _louvain(runner, column, seed: int | None = None):
+    if seed is not None:
+        nk.engineering.setSeed(seed, useThreadId=False)
+    plm = nk.community.PLM(runner.nk_graph(directed=False), refine=True)
+    plm.run()
+    return np.asarray(plm.getPartition().getVector(), dtype=np.int64)
+
+
+def _leiden(runner, column, iterations: int = 3, seed: int | None = None):
+    if seed is not None:
+        nk.engineering.setSeed(seed, useThreadId=False)
+    leiden = nk.community.ParallelLeiden(runner.nk_graph(directed=False), iterations=iterations)
+    leiden.run()
+    return np.asarray(leiden.getPartition().getVector(), dtype=np.int64)
+
+
+JOBS = {
+    "betweenness": _sampled_betweenness,
+    "kadabra": _kadabra_betweenness,
+    "topk_closeness": _topk_closeness,
+    "pagerank": _pagerank,
+    "louvain": _louvain,
+    "leiden": _leiden,
+}
+
+
+class JobRunner:
+    """
+    Runs jobs from JOBS on a CSRGraph and stores the results in a NodeTable.
+
+    NetworKit parallelizes the algorithms itself, the runner only sets the number of
+    threads. Finished columns are returned from disk instead of being recomputed, as long
+    as they were computed by the same job with the same parameters.
+    """
+
+    def __init__(self, graph: CSRGraph, results_dir: str = "graph_results", threads: int | None = None):
+        nk.setNumberOfThreads(threads or os.cpu_count())
+        self.graph = graph
+        self.table = NodeTable(results_dir, graph)
+        self._nk_graphs = {}
+
+    def nk_graph(self, directed: bool) -> nk.Graph:
+        if directed not in self._nk_graphs:
+            self._nk_graphs[directed] = self.graph.to_nk(directed=directed)
+        return self._nk_graphs[directed]
+
+    def _job_params(self, job: str, column: str, params: dict) -> dict:
+        """Job name and all job parameters including defaults, as stored next to the column"""
+        arguments = inspect.signature(JOBS[job]).bind(self, column, **params)
+        arguments.apply_defaults()
+        resolved = {name: value for name, value in arguments.arguments.items() if name not in ("runner", "column")}
+        # json roundtrip, so they compare equal to the parameters loaded from disk
+        return json.loads(json.dumps({"job": job, **resolved}))
+
+    def run(self, job: str, column: str | None = None, recompute: bool = False, **params) -> np.ndarray:
+        """
+        Args:
+            job: Key of JOBS
+            column: Name of the result column, defaults to the job name
+            recompute: Ignore an existing result (partial progress is still used)
+            **params: Passed to the job function
+
+        Returns:
+            np.ndarray: One value per node
+        """
+        column = column or job
+        job_params = self._job_params(job, column, params)
+        if not recompute and self.table.has(column):
+            stored_params = self.table.load_params(column)
+            if stored_params == job_params:
+                print(f"{column}: already computed for graph {self.graph.fingerprint()}")
+                return self.table.load(column)
+            print(f"{column}: recomputing, stored result was computed with {stored_params} instead of {job_params}")
+
+        start = time.perf_counter()
+        values = JOBS[job](self, column, **params)
+        self.table.save(column, values, params=job_params)
+        self.table.drop_partial(column)
+        print(f"{column}: finished in {time.perf_counter() - start:.1f}s")
+        return values
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run centrality and community jobs on a crawled graph')
+    parser.add_argument('graph_file', help='JSONL dataset (original or anonymized)')
+    parser.add_argument('jobs', nargs='+', choices=sorted(JOBS), help='Jobs to run')
+    parser.add_argument('--results-dir', default='graph_results', help='Where result columns are stored (default: graph_results)')
+    parser.add_argument('--threads', type=int, help='Number of threads (default: all cores)')
+    parser.add_argument('--seed', type=int, help='Seed for the randomized jobs')
+    parser.add_argument('--recompute', action='store_true', help='Recompute existing results')
+
+    args = parser.parse_args()
+
+    graph = load_graph_csr(args.graph_file, remove_selfloops=True)
+    runner = JobRunner(graph, args.results_dir, args.threads)
+    print(f"Graph {graph.fingerprint()}: {graph.num_nodes} nodes, {graph.num_edges} edges")
+
+    for job in args.jobs:
+        params = {}
+        if args.seed is not None and job in ("betweenness", "kadabra", "louvain", "leiden"):
+            params["seed"] = args.seed
+        runner.run(job, recompute=args.recompute, **params)
+
+    print(f"Results in {runner.table.path}")
+
+
+if __name__ == '__main__':
+    main()
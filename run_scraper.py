@@ -15,7 +15,7 @@ spec.loader.exec_module(spider_module)
 
 SpotifyGraphSpider = spider_module.SpotifyGraphSpider
 
-def run_scraper(start_user, depth=2, max_followers=100, output_file='output.jsonl', checkpoint_file=None, resume=False):
+def run_scraper(start_user, depth=2, max_followers=100, output_file='output.jsonl', checkpoint_file=None, resume=False, profile_file=None):
     # import debugpy
     # debugpy.listen(("0.0.0.0", 5678)) 
     # print("Waiting for debugger to attach...")
@@ -48,9 +48,16 @@ def run_scraper(start_user, depth=2, max_followers=100, output_file='output.json
         }
     }
     
-    process = CrawlerProcess(settings={
+    settings = {
         "FEEDS": feed_settings
-    })
+    }
+    if profile_file:
+        # only imported when profiling, see crawl_profiler.py
+        settings["EXTENSIONS"] = {"crawl_profiler.CrawlProfiler": 500}
+        settings["PROFILING_ENABLED"] = True
+        settings["PROFILING_OUTPUT"] = profile_file
+    
+    process = CrawlerProcess(settings=settings)
     
     resume_data = json.dumps(checkpoint_data) if (resume and checkpoint_data) else None
     
@@ -64,7 +71,7 @@ def run_scraper(start_user, depth=2, max_followers=100, output_file='output.json
     )
     process.start()
 
-def resume_scraper(checkpoint_file, output_file=None):
+def resume_scraper(checkpoint_file, output_file=None, profile_file=None):
     checkpoint_data = SpotifyGraphSpider.load_checkpoint(checkpoint_file)
     if not checkpoint_data:
         print(f"Error: Checkpoint file not found: {checkpoint_file}")
@@ -87,7 +94,7 @@ def resume_scraper(checkpoint_file, output_file=None):
     print(f"  Queue size: {len(checkpoint_data.get('user_queue', []))} users")
     print()
     
-    run_scraper(start_user, depth, max_followers, output_file, checkpoint_file, resume=True)
+    run_scraper(start_user, depth, max_followers, output_file, checkpoint_file, resume=True, profile_file=profile_file)
 
 
 def main():
@@ -99,11 +106,12 @@ def main():
     parser.add_argument('max_followers', nargs='?', type=int, default=100, help='Maximum followers to scrape per user (default: 100)')
     parser.add_argument('output_file', nargs='?', help='Output file (default: spotify_graph_<user>_<depth>.jsonl)')
     parser.add_argument('--resume', metavar='CHECKPOINT_FILE', help='Resume from a checkpoint file')
+    parser.add_argument('--profile', metavar='PROFILE_FILE', nargs='?', const='profile_spotify_graph.jsonl', help='Record loop lag, callback timings and stack snapshots (default file: profile_spotify_graph.jsonl)')
     
     args = parser.parse_args()
     
     if args.resume:
-        resume_scraper(args.resume, args.output_file or (args.start_user if args.start_user and args.start_user.endswith('.jsonl') else None))
+        resume_scraper(args.resume, args.output_file or (args.start_user if args.start_user and args.start_user.endswith('.jsonl') else None), args.profile)
     elif args.start_user:
         output_file = args.output_file or f'spotify_graph_{args.start_user}_{args.depth}.jsonl'
         
@@ -114,7 +122,7 @@ def main():
         print(f"  Output: {output_file}")
         print()
         
-        run_scraper(args.start_user, args.depth, args.max_followers, output_file)
+        run_scraper(args.start_user, args.depth, args.max_followers, output_file, profile_file=args.profile)
     else:
         parser.print_help()
         sys.exit(1)
@@ -6,6 +6,7 @@ from collections import deque
 from scrapy.http import Request
 from typing import Dict, List, Optional, Set
 import asyncio
+import time
 from scrapy import signals
 
 class SpotifyToken:
@@ -20,6 +21,85 @@ class SpotifyToken:
         return self.headers.copy()
 
 
+class TokenCapturePool:
+    """Bounds the number of concurrent token captures and keeps stats on them.
+
+    scrapy-playwright opens all token pages in the single PLAYWRIGHT_BROWSER_TYPE browser,
+    which it launches with the first playwright request. Every capture still gets a fresh
+    context, otherwise we would get the same token over and over, so max_in_flight has to
+    stay below PLAYWRIGHT_MAX_CONTEXTS.
+    """
+    def __init__(self, max_in_flight: int = 8):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.contexts_opened = 0
+        self.contexts_closed = 0
+        self.context_close_errors = 0
+        self.refill_latencies: List[float] = []
+
+    def acquire(self) -> bool:
+        """Takes a capture slot, False if all of them are in use"""
+        if self.in_flight >= self.max_in_flight:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, requested_at: Optional[float] = None, success: bool = True) -> Optional[float]:
+        """Frees the slot of a finished token request, returns the refill latency in seconds"""
+        if self.in_flight > 0:
+            self.in_flight -= 1
+        if requested_at is None or not success:
+            return None
+        latency = time.monotonic() - requested_at
+        self.refill_latencies.append(latency)
+        return latency
+
+    @property
+    def open_contexts(self) -> int:
+        return self.contexts_opened - self.contexts_closed
+
+    @staticmethod
+    def browser_memory_mb() -> Optional[float]:
+        """RSS of all child processes (playwright driver and browsers). Linux only, None elsewhere"""
+        if not os.path.isdir("/proc"):
+            return None
+        children: Dict[int, List[int]] = {}
+        rss_kb: Dict[int, int] = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/status") as f:
+                    status = dict(line.split(":", 1) for line in f if ":" in line)
+            except OSError:
+                continue  # process is gone already
+            pid = int(entry)
+            children.setdefault(int(status["PPid"]), []).append(pid)
+            rss_kb[pid] = int(status.get("VmRSS", "0 kB").split()[0])
+
+        total_kb = 0
+        stack = list(children.get(os.getpid(), []))
+        while stack:
+            pid = stack.pop()
+            total_kb += rss_kb.get(pid, 0)
+            stack.extend(children.get(pid, []))
+        return total_kb / 1024
+
+    def summary(self) -> Dict[str, float]:
+        latencies = sorted(self.refill_latencies)
+        memory = self.browser_memory_mb()
+        return {
+            "refills": len(latencies),
+            "refill_latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+            "refill_latency_max": latencies[-1] if latencies else 0.0,
+            "contexts_opened": self.contexts_opened,
+            "contexts_closed": self.contexts_closed,
+            "contexts_leaked": self.open_contexts,
+            "context_close_errors": self.context_close_errors,
+            "browser_memory_mb": memory if memory is not None else float("nan"),
+        }
+
+
 class SpotifyGraphSpider(scrapy.Spider):
     name = "spotify_graph"
     
@@ -81,6 +161,8 @@ class SpotifyGraphSpider(scrapy.Spider):
         self.max_tokens = 15
         self.tokens_being_generated = 0
         self.token_request_counter = 0  # Counter to ensure unique contexts
+        self.token_capture_timeout = 10.0  # Seconds to wait for the first token header after navigation
+        self.capture_pool = TokenCapturePool(max_in_flight=8)  # below PLAYWRIGHT_MAX_CONTEXTS
         
         self.user_agents = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
@@ -196,6 +278,16 @@ class SpotifyGraphSpider(scrapy.Spider):
         self.logger.info(f"Tokens in pool at close: {len(self.tokens)}")
         self.logger.info(f"Pending requests at close: {len(self.pending_requests)}")
         self.logger.info(f"User queue at close: {len(self.user_queue)}")
+        pool_stats = self.capture_pool.summary()
+        self.logger.info(
+            f"Token refills: {pool_stats['refills']}, "
+            f"latency avg {pool_stats['refill_latency_avg']:.2f}s / max {pool_stats['refill_latency_max']:.2f}s"
+        )
+        self.logger.info(
+            f"Browser contexts opened: {pool_stats['contexts_opened']}, closed: {pool_stats['contexts_closed']}, "
+            f"leaked: {pool_stats['contexts_leaked']}, close errors: {pool_stats['context_close_errors']}"
+        )
+        self.logger.info(f"Browser memory at close: {pool_stats['browser_memory_mb']:.1f} MB")
         
         # Save checkpoint on any close if there's remaining work
         if len(self.user_queue) > 0 or len(self.pending_requests) > 0:
@@ -207,7 +299,9 @@ class SpotifyGraphSpider(scrapy.Spider):
         
         # Generate init token pool
         for _ in range(self.min_tokens):
-            yield self.create_token_request()
+            token_request = self.create_token_request()
+            if token_request:
+                yield token_request
         
         # If resuming from checkpoint, process the queue
         if self.user_queue:
@@ -221,13 +315,18 @@ class SpotifyGraphSpider(scrapy.Spider):
             yield self.create_follower_request(self.start_user, 0)
 
     def create_token_request(self):
+        if not self.capture_pool.acquire():
+            self.logger.debug("All token capture slots busy, not creating another token request")
+            return None
+
         self.tokens_being_generated += 1
         self.token_request_counter += 1
 
         context_name = f"token_context_{self.token_request_counter}"
         import random
         user_agent = random.choice(self.user_agents)
-        browser_type = random.choice(["chromium", "firefox", "webkit"])
+        captured_tokens = []
+        token_captured = asyncio.Event()
         
         return Request(
             url="https://open.spotify.com/",
@@ -237,22 +336,29 @@ class SpotifyGraphSpider(scrapy.Spider):
                 "playwright": True,
                 "playwright_include_page": True,
                 "playwright_page_init_callback": self.init_token_capture,
+                # listen instead of routing, so the page requests are not intercepted and slowed down
+                "playwright_page_event_handlers": {
+                    "request": self.make_token_capture_handler(captured_tokens, token_captured),
+                },
                 "playwright_context": context_name,  # Unique context per request
-                "playwright_browser_type": browser_type,
                 "playwright_context_kwargs": {
                     "storage_state": None,
                     "ignore_https_errors": True,
                     "user_agent": user_agent,
                 },
+                # don't wait for the page load, parse_token_page waits for the token header instead
+                "playwright_page_goto_kwargs": {"wait_until": "commit"},
+                "captured_tokens": captured_tokens,
+                "token_captured": token_captured,
+                "token_requested_at": time.monotonic(),
             },
             dont_filter=True,
             priority=1000  # Highest priority
         )
 
-    async def init_token_capture(self, page, request):
-        captured_tokens = []
-        
-        async def handle_request(route, pw_request):
+    def make_token_capture_handler(self, captured_tokens: List[Dict[str, str]], token_captured: asyncio.Event):
+        """Returns a page "request" event handler collecting token headers into captured_tokens"""
+        def handle_request(pw_request):
             headers = pw_request.headers
             
             url = pw_request.url
@@ -275,65 +381,94 @@ class SpotifyGraphSpider(scrapy.Spider):
                         
                         if not is_duplicate:
                             captured_tokens.append(token_headers)
+                            token_captured.set()
                             auth_preview = token_headers.get("authorization", "")[:50]
                             self.logger.info(f"Captured headers from {url[:80]}... Auth: {auth_preview}...")
-            
-            await route.continue_()
-        
-        await page.route("**/*", handle_request)
         
+        return handle_request
+
+    async def init_token_capture(self, page, request):
+        # every token request has its own context, see close_token_page
+        self.capture_pool.contexts_opened += 1
+
+    async def close_token_page(self, page):
+        """Close the context of a token page and account for it"""
+        if page is None:
+            return
         try:
-            await page.wait_for_load_state("networkidle", timeout=10000)
-            await page.wait_for_timeout(3000)
+            await page.context.close()
+            self.capture_pool.contexts_closed += 1
         except Exception as e:
-            self.logger.warning(f"Timeout waiting for page load: {e}")
+            self.capture_pool.context_close_errors += 1
+            self.logger.debug(f"Error closing page context: {e}")
 
-        request.meta["captured_tokens"] = captured_tokens
+    def release_token_slot(self, meta: dict, success: bool) -> Optional[float]:
+        """Frees the capture slot of a token request exactly once, returns the refill latency"""
+        if meta.get("token_slot_released"):
+            return None
+        meta["token_slot_released"] = True
+        self.tokens_being_generated -= 1
+        return self.capture_pool.release(meta.get("token_requested_at"), success=success)
 
-    def parse_token_page(self, response):
+    async def parse_token_page(self, response):
         page = response.meta.get("playwright_page")
         captured_tokens = response.meta.get("captured_tokens", [])
+        token_captured = response.meta.get("token_captured")
+        latency = None
 
-        for token_headers in captured_tokens:
-            token = SpotifyToken(token_headers)
-            
-            # Check if token already exists (compare authorization header)
-            existing = False
-            for existing_token in self.tokens:
-                if existing_token.authorization == token.authorization:
-                    existing = True
-                    break
-            
-            if not existing:
-                self.tokens.append(token)
-                self.logger.info(f"Added new token to pool. Total tokens: {len(self.tokens)}")
-        
-
-        if page:
+        try:
+            # navigation only waited for commit, the first token header arrives afterwards
+            if token_captured is not None and not token_captured.is_set():
+                try:
+                    await asyncio.wait_for(token_captured.wait(), timeout=self.token_capture_timeout)
+                except asyncio.TimeoutError:
+                    self.logger.warning(f"No token header seen within {self.token_capture_timeout}s")
 
-            try:
-                asyncio.ensure_future(page.context.close())
-            except Exception as e:
-                self.logger.debug(f"Error closing page context: {e}")
-        
-        self.tokens_being_generated -= 1
+            for token_headers in captured_tokens:
+                token = SpotifyToken(token_headers)
+                
+                # Check if token already exists (compare authorization header)
+                existing = False
+                for existing_token in self.tokens:
+                    if existing_token.authorization == token.authorization:
+                        existing = True
+                        break
+                
+                if not existing:
+                    self.tokens.append(token)
+                    self.logger.info(f"Added new token to pool. Total tokens: {len(self.tokens)}")
+            
+            await self.close_token_page(page)
+        finally:
+            # a leaked slot would block token generation for good
+            latency = self.release_token_slot(response.meta, success=bool(captured_tokens))
         
         if captured_tokens:
-            self.logger.info(f"Successfully captured {len(captured_tokens)} token(s) with full headers from this session")
+            self.logger.info(
+                f"Successfully captured {len(captured_tokens)} token(s) with full headers from this session "
+                f"in {latency or 0:.2f}s (open contexts: {self.capture_pool.open_contexts})"
+            )
         else:
             self.logger.warning("No tokens captured from this session. Page may not have made API calls yet.")
         
         # Process pending requests if we have tokens
-        yield from self.process_pending_requests()
+        return list(self.process_pending_requests())
 
-    def errback_token(self, failure):
+    async def errback_token(self, failure):
         """Handle token generation failures"""
-        self.tokens_being_generated -= 1
+        request = failure.request
+        try:
+            await self.close_token_page(request.meta.get("playwright_page"))
+        finally:
+            self.release_token_slot(request.meta, success=False)
         self.logger.error(f"Token generation failed: {failure}")
         
         # Only retry if we don't have enough tokens yet
         if len(self.tokens) < self.min_tokens and self.tokens_being_generated == 0:
-            yield self.create_token_request()
+            token_request = self.create_token_request()
+            if token_request:
+                return [token_request]
+        return []
 
     def create_follower_request(self, user_id: str, depth: int, is_retry: bool = False, known_name: str = None, known_followers_count: int = None):
         """Create an API request to fetch user followers
@@ -3,6 +3,13 @@ import random
 import numpy as np
 import networkit as nk
 import json
+import hashlib
+import os
+import scipy.sparse as sp
+import tempfile
+from itertools import islice
+
+from anonymize import IdMapping
 
 
 def approx_average_shortest_path_length_nk(
@@ -92,7 +99,233 @@ def load_graph_v3(path: str) -> nx.DiGraph:
 
 
 
-def anonymize_dataset_to_file(input_path: str, output_path: str):
+class CSRGraph:
+    """
+    Directed follower graph in compressed sparse row form.
+
+    Nodes are numbered 0..n-1, edges point from follower to user like in load_graph_v3.
+    Row i of the matrix holds the users node i follows.
+
+    Attributes:
+        indptr, indices: CSR arrays, indices are sorted within every row
+        node_ids: Original (or anonymized) user id per node
+        names: Display name per node, None if unknown/anonymized
+        followers_count: Follower count reported by spotify per node, -1 if unknown
+
+    After build_edge_index (done by load_graph_csr):
+        in_indptr, in_indices: CSR arrays of the transpose, row i holds the followers of node i
+        in_edge: Position in indices of every edge in in_indices
+        reciprocal: Per edge in indices, True if the follow is mutual (selfloops are not)
+        mutual_degree: Number of mutual follows per node
+    """
+
+    def __init__(self, indptr, indices, node_ids, names, followers_count):
+        self.indptr = indptr
+        self.indices = indices
+        self.node_ids = node_ids
+        self.names = names
+        self.followers_count = followers_count
+        self._index = None
+        self._fingerprint = None
+        self.in_indptr = None
+        self.in_indices = None
+        self.in_edge = None
+        self.reciprocal = None
+        self.mutual_degree = None
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    def index_of(self, user_id) -> int:
+        """Node index of a user id, raises KeyError for unknown users"""
+        if self._index is None:
+            self._index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        return self._index[user_id]
+
+    def fingerprint(self) -> str:
+        """Short hash of structure and node ids, identifies the graph results were computed on"""
+        if self._fingerprint is None:
+            h = hashlib.sha256()
+            h.update(self.indptr.astype(np.int64).tobytes())
+            h.update(self.indices.astype(np.int64).tobytes())
+            for node_id in self.node_ids:
+                h.update(str(node_id).encode())
+                h.update(b"\0")
+            self._fingerprint = h.hexdigest()[:16]
+        return self._fingerprint
+
+    def edge_sources(self) -> np.ndarray:
+        """Source node of every edge, aligned with indices"""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr))
+
+    def build_edge_index(self):
+        """
+        Builds the transposed CSR, the reciprocity flag of every edge and the mutual degree per node.
+        Rows are sorted, so a reverse edge can be looked up with a binary search over all edge keys.
+        """
+        if self.reciprocal is not None:
+            return
+        sources = self.edge_sources()
+        targets = self.indices.astype(np.int64)
+
+        keys = sources * self.num_nodes + targets
+        reverse_keys = targets * self.num_nodes + sources
+        positions = np.minimum(np.searchsorted(keys, reverse_keys), max(len(keys) - 1, 0))
+        self.reciprocal = (keys[positions] == reverse_keys) & (sources != targets)
+        self.mutual_degree = np.bincount(sources[self.reciprocal], minlength=self.num_nodes)
+
+        # stable sort by target keeps the followers of every node sorted
+        self.in_edge = np.argsort(targets, kind="stable")
+        self.in_indices = sources[self.in_edge].astype(np.int32)
+        self.in_indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(targets, minlength=self.num_nodes), out=self.in_indptr[1:])
+
+    def following(self, i: int) -> np.ndarray:
+        """Nodes followed by node i"""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def followers(self, i: int) -> np.ndarray:
+        """Followers of node i, needs build_edge_index"""
+        return self.in_indices[self.in_indptr[i]:self.in_indptr[i + 1]]
+
+    def reciprocity(self) -> float:
+        """Share of (non selfloop) edges that are mutual follows"""
+        self.build_edge_index()
+        num_edges = self.num_edges - int(np.count_nonzero(self.edge_sources() == self.indices))
+        return float(self.reciprocal.sum() / num_edges) if num_edges else 0.0
+
+    def mutual_graph(self) -> "CSRGraph":
+        """
+        Graph with only the mutual follows, same nodes and node indices. Edges are stored in both directions,
+        to_nk(directed=False) gives the undirected graph without going through NetworkX.
+        """
+        self.build_edge_index()
+        indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(self.mutual_degree, out=indptr[1:])
+        return CSRGraph(
+            indptr=indptr,
+            indices=self.indices[self.reciprocal],
+            node_ids=self.node_ids,
+            names=self.names,
+            followers_count=self.followers_count,
+        )
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def in_degree(self) -> np.ndarray:
+        if self.in_indptr is not None:
+            return np.diff(self.in_indptr)
+        return np.bincount(self.indices, minlength=self.num_nodes)
+
+    def to_scipy(self) -> sp.csr_matrix:
+        data = np.ones(self.num_edges, dtype=np.int8)
+        return sp.csr_matrix((data, self.indices, self.indptr), shape=(self.num_nodes, self.num_nodes))
+
+    def to_nk(self, directed: bool = False) -> nk.Graph:
+        """
+        Converts to a NetworKit graph with the same node indices, without going through NetworkX.
+        The undirected version equals G.to_undirected() without selfloops.
+        """
+        coo = self.to_scipy().tocoo()
+        rows, cols = coo.row, coo.col
+        if not directed:
+            rows, cols = np.minimum(coo.row, coo.col), np.maximum(coo.row, coo.col)
+            keep = rows != cols
+            pairs = np.unique(rows[keep].astype(np.int64) * self.num_nodes + cols[keep])
+            rows, cols = pairs // self.num_nodes, pairs % self.num_nodes
+        graph = nk.Graph(self.num_nodes, directed=directed)
+        graph.addEdges((rows.astype(np.uint64), cols.astype(np.uint64)))
+        return graph
+
+
+def load_graph_csr(path: str, remove_selfloops: bool = False, build_edge_index: bool = True) -> CSRGraph:
+    """
+    Reads the same JSONL format as load_graph_v3, but builds a CSRGraph instead of a NetworkX graph.
+    Duplicate edges are dropped.
+
+    Args:
+        path: JSONL dataset (original or anonymized)
+        remove_selfloops: Drop edges from a user to itself
+        build_edge_index: Also build the transpose and reciprocity index, see CSRGraph.build_edge_index
+
+    Returns:
+        CSRGraph
+    """
+    index = {}
+    node_ids = []
+    names = []
+    followers_count = []
+    sources = []
+    targets = []
+    error_count = 0
+    line_count = 0
+
+    def get_index(user_id, name, count):
+        i = index.get(user_id)
+        if i is None:
+            i = index[user_id] = len(node_ids)
+            node_ids.append(user_id)
+            names.append(name)
+            followers_count.append(-1 if count is None else count)
+        else:
+            # later records overwrite, same as add_node in load_graph_v3
+            names[i] = name
+            followers_count[i] = -1 if count is None else count
+        return i
+
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            line_count += 1
+            if "error" in record:
+                error_count += 1
+                continue
+
+            user_index = get_index(record["id"], record["name"], record["followers_count"])
+            for follower_id, name, follower_follower_count in record.get("follower_profiles", []):
+                sources.append(get_index(follower_id, name, follower_follower_count))
+                targets.append(user_index)
+    print("Lines read: ", line_count)
+    print("Errors found : ", error_count)
+
+    num_nodes = len(node_ids)
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    if remove_selfloops:
+        keep = sources != targets
+        sources, targets = sources[keep], targets[keep]
+
+    # sorted unique edge keys give row-major order with sorted, deduplicated rows
+    keys = np.unique(sources * num_nodes + targets)
+    sources, targets = keys // num_nodes, keys % num_nodes
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+
+    graph = CSRGraph(
+        indptr=indptr,
+        indices=targets.astype(np.int32),
+        node_ids=node_ids,
+        names=names,
+        followers_count=np.asarray(followers_count, dtype=np.int64),
+    )
+    if build_edge_index:
+        graph.build_edge_index()
+    return graph
+
+
+def anonymize_dataset_to_file(
+    input_path: str,
+    output_path: str,
+    mapping_path: str | None = None,
+    incremental: bool = False,
+    chunk_size: int = 10000,
+):
     """
     Reads original json dataset and ananonymizes with ascending user ids. 
     
@@ -106,48 +339,101 @@ def anonymize_dataset_to_file(input_path: str, output_path: str):
             ...
         ]
     }
+
+    The id mapping lives on disk (see anonymize.IdMapping) and the input is processed
+    in chunks, so memory stays bounded regardless of the dataset size.
+
+    Args:
+        input_path: Original JSONL dataset
+        output_path: Anonymized JSONL output
+        mapping_path: SQLite file holding the id mapping. Reuse it across runs to get
+            stable ids for overlapping crawls. If None, a temporary mapping is used.
+        incremental: Only export records not exported with this mapping before and
+            append them to output_path. Requires mapping_path. Records written after the
+            last commit of an interrupted run are truncated away first.
+        chunk_size: Number of input lines processed per batch
     """
-    mapping = {}
-    next_id = 0
-    
-    def get_id(original_id):
-        nonlocal next_id
-        if original_id not in mapping:
-            mapping[original_id] = next_id
-            next_id += 1
-        return mapping[original_id]
+    if incremental and mapping_path is None:
+        raise ValueError("incremental export requires a persistent mapping_path")
 
-    error_count = 0
-    with open(input_path, 'r') as f_in, open(output_path, 'w') as f_out:
-        for line in f_in:
-            try:
-                record = json.loads(line)
-                
-                if "error" in record:
-                    continue
-                
-                original_uid = record["id"]
-                anon_uid = get_id(original_uid)
-                followers_count = record["followers_count"]
-
-                anon_profiles = []
-                for fol_id, _, fol_count in record.get("follower_profiles", []):
-                    anon_fol_id = get_id(fol_id)
+    tmp_dir = None
+    if mapping_path is None:
+        tmp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path)))
+        mapping_path = os.path.join(tmp_dir.name, "mapping.sqlite")
+
+    exported_count = 0
+    skipped_count = 0
+    mapping = IdMapping(mapping_path)
+    try:
+        committed_size = mapping.committed_size(output_path) if incremental else None
+        if committed_size is not None and os.path.exists(output_path) and os.path.getsize(output_path) > committed_size:
+            # a crash between writing and committing left records on disk that are not marked as exported
+            print(f"Truncating {output_path} to last committed size {committed_size}")
+            with open(output_path, 'r+b') as f:
+                f.truncate(committed_size)
+
+        with open(input_path, 'r') as f_in, open(output_path, 'a' if incremental else 'w') as f_out:
+            while True:
+                lines = list(islice(f_in, chunk_size))
+                if not lines:
+                    break
+
+                records = []
+                for line in lines:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if "error" in record:
+                        continue
+                    records.append(record)
+
+                if incremental:
+                    # records of the same user in one chunk are common after resumed crawls, keep the first
+                    seen = mapping.exported(r["id"] for r in records)
+                    new_records = []
+                    for record in records:
+                        if str(record["id"]) not in seen:
+                            seen.add(str(record["id"]))
+                            new_records.append(record)
+                    skipped_count += len(records) - len(new_records)
+                    records = new_records
+
+                # user id before its followers keeps the id order of the in-memory version
+                ids = mapping.get_ids(
+                    original_id
+                    for record in records
+                    for original_id in [record["id"]] + [p[0] for p in record.get("follower_profiles", [])]
+                )
+
+                for record in records:
                     #  keep the structure [id, name, count] but name is None to keep loaders
-                    anon_profiles.append([anon_fol_id, None, fol_count])
-                
-                new_record = {
-                    "id": anon_uid,
-                    "name": None, # Explicitly remove name
-                    "followers_count": followers_count,
-                    "follower_profiles": anon_profiles
-                }
-                
-                f_out.write(json.dumps(new_record) + "\n")
-                
-            except json.JSONDecodeError:
-                continue
+                    anon_profiles = [
+                        [ids[str(fol_id)], None, fol_count]
+                        for fol_id, _, fol_count in record.get("follower_profiles", [])
+                    ]
+                    new_record = {
+                        "id": ids[str(record["id"])],
+                        "name": None, # Explicitly remove name
+                        "followers_count": record["followers_count"],
+                        "follower_profiles": anon_profiles
+                    }
+                    f_out.write(json.dumps(new_record) + "\n")
 
-    print(f"Exported anonymized dataset to {output_path}")
-    print(f"Total unique nodes: {len(mapping)}")
+                # flush before committing, so the mapping never claims records that are not on disk
+                f_out.flush()
+                mapping.mark_exported(r["id"] for r in records)
+                mapping.set_committed_size(output_path, os.fstat(f_out.fileno()).st_size)
+                mapping.commit()
+                exported_count += len(records)
+        total_nodes = len(mapping)
+    finally:
+        mapping.close()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
 
+    print(f"Exported anonymized dataset to {output_path}")
+    print(f"Records exported: {exported_count}")
+    if incremental:
+        print(f"Records skipped (already exported or duplicate): {skipped_count}")
+    print(f"Total unique nodes: {total_nodes}")